@@ -0,0 +1,72 @@
+import numpy as np
+from numba import njit, prange
+
+from plantsim.config import Config
+
+
+def _kernel(func):
+    """Compile a kernel with numba, or keep it as plain Python when `Config.use_numba` is disabled"""
+
+    return njit(cache=True)(func) if Config.use_numba else func
+
+
+def _parallel_kernel(func):
+    """
+    Compile a kernel whose `prange` loops run on all cores when `Config.parallel` is enabled.
+    The numba disk cache does not tell serial and parallel builds apart, so only the serial build is cached.
+    """
+
+    if not Config.use_numba:
+        return func
+    if Config.parallel:
+        return njit(parallel=True)(func)
+    return njit(cache=True)(func)
+
+
+@_kernel
+def apply_loss_and_share_resources(
+    cell_type: np.ndarray,
+    parent_idx: np.ndarray,
+    water: np.ndarray,
+    energy: np.ndarray,
+    loss_water: np.ndarray,
+    loss_energy: np.ndarray,
+    n_cells: int,
+):
+    """
+    Subtract the constant loss of each cell, looked up by its cell type code,
+    and then share its water and energy with its parent by averaging them, in a single pass.
+    Parents come before their children in the rows, so every parent loses its resources before it shares them.
+    """
+
+    for i in range(n_cells):
+        water[i] -= loss_water[cell_type[i]]
+        energy[i] -= loss_energy[cell_type[i]]
+
+        parent = parent_idx[i]
+        if parent >= 0:
+            total_water = water[parent] + water[i]
+            total_energy = energy[parent] + energy[i]
+            water[i] = water[parent] = total_water / 2
+            energy[i] = energy[parent] = total_energy / 2
+
+
+@_parallel_kernel
+def collect_resources(
+    cell_type: np.ndarray,
+    water: np.ndarray,
+    energy: np.ndarray,
+    water_gain: np.ndarray,
+    energy_gain: np.ndarray,
+    soil_factor: float,
+    air_factor: float,
+    n_cells: int,
+):
+    """
+    Collect water and energy in proportion to the factors of empty soil and empty air surrounding the cells.
+    Every cell only writes its own resources, so the cells can be processed in parallel.
+    """
+
+    for i in prange(n_cells):
+        water[i] += water_gain[cell_type[i]] * soil_factor
+        energy[i] += energy_gain[cell_type[i]] * air_factor
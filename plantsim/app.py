@@ -1,7 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
 
-import time
 import numpy as np
 
 from plantsim.plant_sim import PlantSim
@@ -11,21 +10,21 @@ import contextlib
 with contextlib.redirect_stdout(None):
     import pygame
     from pygame import DOUBLEBUF, HWSURFACE, Surface
-
-from pydantic import BaseModel, ConfigDict
-from pydantic_numpy import np_array_pydantic_annotated_typing as ndarray
+    from pygame.time import Clock
 
 from plantsim.config import Config
 
 
-@dataclass(kw_only=True)
+@dataclass(slots=True, kw_only=True)
 class App:
-    tick_count = 0
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+    tick_count: int = 0
     plant_sim: PlantSim
     background_array: np.ndarray
-    plant_image_data: np.ndarray
+    frame_buffer: np.ndarray
     display: Surface
+    scaled_pixels: np.ndarray  # window sized (height, width, 3) RGB pixel data, upscaled from the frame buffer
+    scaled_surface: Surface  # window sized surface sharing its pixel buffer with `scaled_pixels`
+    clock: Clock
 
     @classmethod
     def create(cls) -> App:
@@ -34,7 +33,8 @@ class App:
         # create plantsim
         plant_sim = PlantSim.create()
         background_array = plant_sim.get_background_array()
-        plant_image_data = np.zeros(shape=(background_array.shape[0], background_array.shape[1], 3), dtype=np.uint8)
+        frame_buffer = np.empty_like(background_array)
+        scaled_pixels = np.zeros(shape=(Config.window_size.y, Config.window_size.x, 3), dtype=np.uint8)
 
         # init pygame and create a display
         pygame.init()
@@ -42,21 +42,25 @@ class App:
             size=Config.window_size.xy, flags=HWSURFACE | DOUBLEBUF
         )
         pygame.display.set_caption(f"{Config.app_title}")
+        scaled_surface = pygame.image.frombuffer(scaled_pixels, Config.window_size.xy, "RGB")
 
         # create app
         return App(
-            plant_sim=plant_sim, display=display, background_array=background_array, plant_image_data=plant_image_data
+            plant_sim=plant_sim,
+            display=display,
+            background_array=background_array,
+            frame_buffer=frame_buffer,
+            scaled_pixels=scaled_pixels,
+            scaled_surface=scaled_surface,
+            clock=Clock(),
         )
 
     def run(self):
         """Run the main loop of the app"""
 
         running = True
-        tick_time = 1 / Config.tick_rate if Config.tick_rate > 0 else 0 # seconds per tick
 
         while running:
-            tick_start = time.perf_counter()
-
             for event in pygame.event.get():
                 if event.type == pygame.QUIT or (
                     event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
@@ -70,9 +74,8 @@ class App:
             pygame.display.set_caption(f"{Config.app_title} ({self.tick_count})")
 
             # wait for next tick
-            if tick_time > 0:
-                while time.perf_counter() - tick_start < tick_time:
-                    time.sleep(0.001)
+            if Config.tick_rate > 0:
+                self.clock.tick(Config.tick_rate)
 
         pygame.quit()
 
@@ -86,18 +89,18 @@ class App:
     def _draw(self):
         """Draw to the display"""
 
-        # draw pixel data
-        image_data = self.background_array.copy()
-        plant_image_data = self.plant_sim.draw(image_data)
-
-        # check if image data has changed
-        if not (plant_image_data == self.plant_image_data).all():
-            self.plant_image_data = plant_image_data
-
-            # create and scale surface for big pixels
-            surface = pygame.surfarray.make_surface(image_data)
-            scaled_surface = pygame.transform.scale(surface, Config.window_size.xy)
-            self.display.blit(scaled_surface, (0, 0))
+        # only redraw if the simulation has changed since the last frame
+        if self.plant_sim.consume_dirty():
+            # draw pixel data into the reused frame buffer
+            np.copyto(self.frame_buffer, self.background_array)
+            image_data = self.plant_sim.draw(self.frame_buffer)
+
+            # upscale to big pixels by broadcasting each grid cell over a pixel_size x pixel_size block,
+            # which also updates `scaled_surface` since it shares the same buffer
+            self.scaled_pixels.reshape(
+                Config.grid_size.y, Config.pixel_size, Config.grid_size.x, Config.pixel_size, 3
+            )[...] = image_data[:, None, :, None, :]
+            self.display.blit(self.scaled_surface, (0, 0))
             pygame.display.update()
 
     def _restart(self):
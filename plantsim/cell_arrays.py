@@ -0,0 +1,164 @@
+from __future__ import annotations
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from plantsim.cell_types import CellType
+from plantsim.config import Config
+
+_DIRECTIONS = Config.coords_for_directions
+
+
+@dataclass(slots=True, kw_only=True)
+class CellArrays:
+    """
+    Structure of arrays holding the state of the plant cells of all plants, one row per cell.
+    The arrays are allocated with spare capacity, only the first `size` rows are in use.
+    Cells are kept in the order they were added, so parents always come before their children.
+    """
+
+    size: int = 0
+    coord_xy: np.ndarray  # (capacity, 2) int32
+    neighbor_idx: np.ndarray  # (capacity, 8) int32 flat index of each neighbor into the padded grid flags
+    plant_id: np.ndarray  # int32 index of the plant the cell belongs to
+    cell_type: np.ndarray  # int8 cell type codes
+    parent_idx: np.ndarray  # int32 row of the parent cell, -1 for cells without parent
+    cell_distance: np.ndarray  # int32
+    age: np.ndarray  # int32 age in ticks
+    growth_cooldown: np.ndarray  # int16
+    water: np.ndarray  # float32
+    energy: np.ndarray  # float32
+    seed_progress_water: np.ndarray  # float32
+    seed_progress_energy: np.ndarray  # float32
+
+    @classmethod
+    def create(cls, capacity: int = 1024) -> CellArrays:
+        """Create empty cell arrays"""
+
+        return CellArrays(
+            coord_xy=np.zeros((capacity, 2), dtype=np.int32),
+            neighbor_idx=np.full((capacity, len(_DIRECTIONS)), -1, dtype=np.int32),
+            plant_id=np.zeros(capacity, dtype=np.int32),
+            cell_type=np.zeros(capacity, dtype=np.int8),
+            parent_idx=np.full(capacity, -1, dtype=np.int32),
+            cell_distance=np.zeros(capacity, dtype=np.int32),
+            age=np.zeros(capacity, dtype=np.int32),
+            growth_cooldown=np.zeros(capacity, dtype=np.int16),
+            water=np.zeros(capacity, dtype=np.float32),
+            energy=np.zeros(capacity, dtype=np.float32),
+            seed_progress_water=np.zeros(capacity, dtype=np.float32),
+            seed_progress_energy=np.zeros(capacity, dtype=np.float32),
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.cell_type)
+
+    def _columns(self) -> list[str]:
+        return [f.name for f in fields(self) if f.name != "size"]
+
+    def _grow(self):
+        """Double the capacity of all arrays"""
+
+        for name in self._columns():
+            column = getattr(self, name)
+            new_column = np.zeros((2 * len(column), *column.shape[1:]), dtype=column.dtype)
+            new_column[: len(column)] = column
+            setattr(self, name, new_column)
+
+    def append(
+        self,
+        *,
+        coord: tuple[int, int],
+        plant_id: int,
+        cell_type: CellType,
+        parent_idx: int = -1,
+        cell_distance: int = 0,
+        water: float = 0.0,
+        energy: float = 0.0,
+    ) -> int:
+        """Add a new cell and return its row"""
+
+        if self.size == self.capacity:
+            self._grow()
+
+        row = self.size
+        self.coord_xy[row] = coord
+        self.neighbor_idx[row] = _get_neighbor_idx(coord)
+        self.plant_id[row] = plant_id
+        self.cell_type[row] = cell_type
+        self.parent_idx[row] = parent_idx
+        self.cell_distance[row] = cell_distance
+        self.age[row] = 0
+        self.growth_cooldown[row] = 0
+        self.water[row] = water
+        self.energy[row] = energy
+        self.seed_progress_water[row] = 0.0
+        self.seed_progress_energy[row] = 0.0
+        self.size += 1
+
+        return row
+
+    def extend(self, new_cells: list[tuple[int, int, int, int, int, int, float, float]]):
+        """
+        Add new cells at once, from (x, y, plant_id, cell_type, parent_idx, cell_distance, water, energy) tuples.
+        Their other columns start from zero, like in `append`.
+        """
+
+        start = self.size
+        end = start + len(new_cells)
+        while end > self.capacity:
+            self._grow()
+
+        xs, ys, plant_id, cell_type, parent_idx, cell_distance, water, energy = zip(*new_cells)
+        coord_xy = np.column_stack((xs, ys))
+        self.coord_xy[start:end] = coord_xy
+        self.neighbor_idx[start:end] = _get_neighbor_idx(coord_xy)
+        self.plant_id[start:end] = plant_id
+        self.cell_type[start:end] = cell_type
+        self.parent_idx[start:end] = parent_idx
+        self.cell_distance[start:end] = cell_distance
+        self.age[start:end] = 0
+        self.growth_cooldown[start:end] = 0
+        self.water[start:end] = water
+        self.energy[start:end] = energy
+        self.seed_progress_water[start:end] = 0.0
+        self.seed_progress_energy[start:end] = 0.0
+        self.size = end
+
+    def remove_rows(self, rows: np.ndarray):
+        """
+        Remove cells, keeping the order of the remaining ones.
+        Children of removed cells lose their parent, the parent rows of the other cells are updated.
+        """
+
+        is_kept = np.ones(self.size, dtype=np.bool_)
+        is_kept[rows] = False
+        new_rows = np.cumsum(is_kept, dtype=np.int32) - 1
+        new_rows[~is_kept] = -1
+
+        parent_idx = self.parent_idx[: self.size][is_kept]
+        has_parent = parent_idx >= 0
+        parent_idx[has_parent] = new_rows[parent_idx[has_parent]]
+
+        n_kept = len(parent_idx)
+        for name in self._columns():
+            column = getattr(self, name)
+            column[:n_kept] = column[: self.size][is_kept]
+        self.parent_idx[:n_kept] = parent_idx
+        self.size = n_kept
+
+
+def _get_neighbor_idx(coord: tuple[int, int] | np.ndarray) -> np.ndarray:
+    """
+    Return the flat index of each neighbor of a coord, or of (n, 2) coords, into a C-contiguous
+    (width + 2, height + 2) grid, padded by one coordinate on each side so that the neighbors
+    of coords on the edge are still inside of it.
+    """
+
+    padded_height = Config.grid_size.y + 2
+    neighbor_coords = np.asarray(coord)[..., None, :] + _DIRECTIONS + 1
+    return neighbor_coords[..., 0] * padded_height + neighbor_coords[..., 1]
@@ -1,8 +1,17 @@
-from enum import Enum
-
-class CellType(Enum):
-    SEED = "SEED"
-    ROOT = "ROOT"
-    STEM = "STEM"
-    LEAF = "LEAF"
-    FLOWER = "FLOWER"
+from enum import IntEnum
+
+class CellType(IntEnum):
+    SEED = 1
+    ROOT = 2
+    STEM = 3
+    LEAF = 4
+    FLOWER = 5
+
+
+# additional codes for cell grids, next to the cell types
+EMPTY_CELL_CODE = 0
+DEAD_CELL_CODE = len(CellType) + 1
+
+# bit flags of the grid flags matrix, so that a single read tells whether a coordinate is ground and/or occupied
+GROUND_FLAG = 0b01
+OCCUPIED_FLAG = 0b10
@@ -1,4 +1,5 @@
 from pathlib import Path
+import numpy as np
 
 from plantsim.cell_types import CellType
 from plantsim.coord import Coord
@@ -14,7 +15,8 @@ class Config:
 
     # VISUAL
     window_size = Coord(1280, 720)
-    grid_size = Coord(window_size.x / 4, window_size.y / 4)
+    pixel_size = 4  # window pixels per grid cell
+    grid_size = Coord(window_size.x // pixel_size, window_size.y // pixel_size)
     air_color = (194, 234, 246)
     ground_color = (206, 163, 97)
 
@@ -26,6 +28,9 @@ class Config:
         CellType.FLOWER: (255, 128, 255),  # TODO make hue variable from genome
     }
     dead_cell_color = (80, 49, 33)
+    cell_grid_palette = np.array(  # colors indexed by cell grid codes, empty cells are never drawn
+        [air_color, *map(cell_type_colors.get, CellType), dead_cell_color], dtype=np.uint8
+    )
 
     # SIMULATION
     initial_plant_coord = Coord(int(grid_size.x / 2), int(grid_size.y / 4))
@@ -63,13 +68,18 @@ class Config:
     }
 
     # MISC
-    coords_for_directions = [
-        Coord(1, 0),
-        Coord(1, -1),
-        Coord(0, -1),
-        Coord(-1, -1),
-        Coord(-1, 0),
-        Coord(-1, 1),
-        Coord(0, 1),
-        Coord(1, 1),
-    ]
+    use_numba = True  # compile the cell kernels, disable to run them as plain Python for debugging
+    parallel = False  # run the independent per-cell kernels on all cores, compiled again on each start
+    coords_for_directions = np.array(  # (dx, dy) offset of each direction
+        [
+            (1, 0),
+            (1, -1),
+            (0, -1),
+            (-1, -1),
+            (-1, 0),
+            (-1, 1),
+            (0, 1),
+            (1, 1),
+        ],
+        dtype=np.int8,
+    )
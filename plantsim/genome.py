@@ -1,74 +1,85 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from random import random
+from dataclasses import dataclass, field
 
 from plantsim.cell_types import CellType
 from plantsim.config import Config
 import numpy as np
 
+_rng = np.random.default_rng()
 
-@dataclass(kw_only=True)
+# config values used on the hot expression path, bound once since the config does not change at runtime
+_BASE_GROWTH_P = Config.base_growth_p
+_DISTANCE_FACTOR_SCALE = Config.distance_factor_scale
+
+N_FACTORS = 5  # age, local density, cell distance, water, energy
+
+
+@dataclass(slots=True, kw_only=True)
 class Genome:
     directional_growth: dict[CellType, CellTypeGrowthInfo]
+    growth_info_by_code: list[CellTypeGrowthInfo | None] = field(init=False)  # indexed by int8 cell type code
+
+    def __post_init__(self):
+        self.growth_info_by_code = [self.directional_growth.get(code) for code in range(len(CellType) + 1)]
 
     @classmethod
     def init_random(cls) -> Genome:
         """Initialize a random genome"""
 
         directional_growth = {
-            CellType.SEED: CellTypeGrowthInfo({
-                CellType.STEM: [DirectionalGrowthGenes.init_zero() for _ in range(8)],
-                 CellType.ROOT: [DirectionalGrowthGenes.init_zero() for _ in range(8)],
-                 }
+            CellType.SEED: CellTypeGrowthInfo.init_random({CellType.STEM: [False] * 8, CellType.ROOT: [False] * 8}),
+            CellType.ROOT: CellTypeGrowthInfo.init_random({CellType.ROOT: [False] * 5 + [True] * 3}),
+            CellType.STEM: CellTypeGrowthInfo.init_random(
+                {
+                    CellType.STEM: [False, True, True, True, False, False, False, False],
+                    CellType.LEAF: [True] * 8,
+                    CellType.FLOWER: [True] * 8,
+                }
             ),
-            CellType.ROOT: CellTypeGrowthInfo({
-                 CellType.ROOT: [DirectionalGrowthGenes.init_zero(), DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_random(),DirectionalGrowthGenes.init_random(),DirectionalGrowthGenes.init_random()],
-                 }
-            ),
-            CellType.STEM: CellTypeGrowthInfo({
-                 CellType.STEM: [DirectionalGrowthGenes.init_zero(), DirectionalGrowthGenes.init_random(),DirectionalGrowthGenes.init_random(),DirectionalGrowthGenes.init_random(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero(),DirectionalGrowthGenes.init_zero()],
-                 CellType.LEAF: [DirectionalGrowthGenes.init_random() for _ in range(8)],
-                 CellType.FLOWER: [DirectionalGrowthGenes.init_random() for _ in range(8)],
-                 }
-            ),
-            CellType.LEAF: CellTypeGrowthInfo({}),
-            CellType.FLOWER: CellTypeGrowthInfo({}),
+            CellType.LEAF: CellTypeGrowthInfo.init_random({}),
+            CellType.FLOWER: CellTypeGrowthInfo.init_random({}),
         }
 
-        #     cell_type: CellTypeGrowthInfo(
-        #         growth_genome_for_celltype={
-        #             growable_cell_type: [
-        #                 DirectionalGrowthGenes.init_zero()
-        #                 if cell_type is CellType.SEED or cell_type is CellType.ROOT
-        #                 else DirectionalGrowthGenes.init_random()
-        #                 for _ in range(8)
-        #             ]
-        #             for growable_cell_type in Config.growable_types[cell_type]
-        #         }
-        #     )
-        #     for cell_type in CellType
-        # }
-
         # stem goes up, root goes down. fosho.
-        directional_growth[CellType.SEED].growth_genome_for_celltype[CellType.STEM][2].growth_p = 1
-        directional_growth[CellType.SEED].growth_genome_for_celltype[CellType.ROOT][6].growth_p = 1
+        directional_growth[CellType.SEED].set_growth_p(CellType.STEM, 2, 1)
+        directional_growth[CellType.SEED].set_growth_p(CellType.ROOT, 6, 1)
 
         return Genome(directional_growth=directional_growth)
 
     def get_mutation(self) -> Genome:  # TODO
-        """Return a mutated copy of the genome"""
+        """
+        Return a mutated copy of the genome.
+        The random numbers for all directional genes are drawn at once.
+        """
+
+        gene_matrices = [growth_info.get_gene_matrix() for growth_info in self.directional_growth.values()]
+        all_factors = np.concatenate(gene_matrices)
+        n_genes, n_factors_plus_growth = all_factors.shape
 
+        is_direction_mutated = _rng.random(n_genes) < Config.direction_mutation_p
+        is_mutated = (_rng.random(all_factors.shape) < (1 / n_factors_plus_growth)) & is_direction_mutated[:, None]
+        is_redetermination = _rng.random(all_factors.shape) < Config.redetermination_p
+
+        factors_offset = (
+            _rng.standard_normal(all_factors.shape, dtype=np.float32) * Config.mutation_sigma * Config.base_growth_p
+        )
+        factors_redetermination = _rng.random(all_factors.shape, dtype=np.float32) * Config.base_growth_p
+
+        # the offset buffer is reused for the mutated factors to avoid temporaries
+        mutated_factors = np.add(all_factors, factors_offset, out=factors_offset)
+        np.copyto(mutated_factors, factors_redetermination, where=is_redetermination)
+        new_factors = np.where(is_mutated, mutated_factors, all_factors)
+
+        split_indices = np.cumsum([len(gene_matrix) for gene_matrix in gene_matrices])[:-1]
         mutated_directional_growth = {
-            cell_type: growth_info.get_mutation() for cell_type, growth_info in self.directional_growth.items()
+            cell_type: growth_info.from_gene_matrix(new_gene_matrix)
+            for (cell_type, growth_info), new_gene_matrix in zip(
+                self.directional_growth.items(), np.split(new_factors, split_indices)
+            )
         }
 
         return Genome(directional_growth=mutated_directional_growth)
 
-    def test_expression(
-        self, cell_type: CellType, age: float, density: float, distance: int, water: float, energy: float
-    ) -> dict[CellType, list[bool]]:
-        return self.directional_growth[cell_type].test_expression(age, density, distance, water, energy)
-
     @property
     def flower_color(self) -> tuple[int, int, int]:
         """Determine color hue based on genome, and return RGB value"""
@@ -76,7 +87,7 @@ class Genome:
         return (0, 0, 0)
 
 
-@dataclass
+@dataclass(slots=True, kw_only=True)
 class CellTypeGrowthInfo:
     """
     Probabilities for a specific plant cell to grow another
@@ -84,88 +95,57 @@ class CellTypeGrowthInfo:
     and rotating counter-clockwise.
     """
 
-    growth_genome_for_celltype: dict[CellType, list[DirectionalGrowthGenes]]
-
-    def test_expression(
-        self, age: float, density: float, distance: int, water: float, energy: float
-    ) -> dict[CellType, list[bool]]:
-        return {
-            cell_type: [genes.test_expression(age, density, distance, water, energy) for genes in genes_list]
-            for cell_type, genes_list in self.growth_genome_for_celltype.items()
-        }
-
-    def get_mutation(self) -> CellTypeGrowthInfo:  # TODO
-        """Return a mutated copy of the growth info"""
-
-        growth_genome_for_celltype = {
-            cell_type: [directional_genes.get_mutation() for directional_genes in directional_genes_list]
-            for cell_type, directional_genes_list in self.growth_genome_for_celltype.items()
-        }
-
-        return CellTypeGrowthInfo(growth_genome_for_celltype=growth_genome_for_celltype)
-
-
-@dataclass(kw_only=True)
-class DirectionalGrowthGenes:
-    """
-    Growth info for a specific direction.
-    """
-
-    growth_p: float
-    factors: np.ndarray
-    n_factors = 5  # age, local density, cell distance, water, energy
+    growable_types: list[CellType]  # cell types in the order of the gene matrices
+    genes_mat: np.ndarray  # float32 (n_growable, 8, N_FACTORS + 1), growth probability last
 
     @classmethod
-    def init_random(cls) -> DirectionalGrowthGenes:
-        return DirectionalGrowthGenes(
-            growth_p=Config.base_growth_p,
-            factors=np.random.uniform(size=DirectionalGrowthGenes.n_factors) * Config.base_growth_p,
-        )
+    def init_random(cls, random_directions: dict[CellType, list[bool]]) -> CellTypeGrowthInfo:
+        """
+        Initialize a growth info for the growable cell types of `random_directions`.
+        The genes of the directions flagged there are random, the others are zero.
+        """
 
-    @classmethod
-    def init_zero(cls) -> DirectionalGrowthGenes:
-        return DirectionalGrowthGenes(
-            growth_p=0,
-            factors=np.zeros(DirectionalGrowthGenes.n_factors),
-        )
+        is_random = np.array(list(random_directions.values()), dtype=np.bool_).reshape(-1, 8)
+        genes_mat = np.full((*is_random.shape, N_FACTORS + 1), Config.base_growth_p, dtype=np.float32)
+        genes_mat[..., :-1] *= _rng.uniform(size=(*is_random.shape, N_FACTORS))
+        genes_mat[~is_random] = 0.0
 
-    def test_expression(self, age: float, density: float, distance: int, water: float, energy: float) -> bool:
-        """Test whether the gene is randomly expressed or not"""
+        return CellTypeGrowthInfo(growable_types=list(random_directions.keys()), genes_mat=genes_mat)
 
-        factor_array = np.array(
-            [age, density, distance * Config.distance_factor_scale, water, energy]
-        )  # TODO add inverse factors too ?
-        combined_factors = factor_array.dot(self.factors) * Config.base_growth_p
+    def set_growth_p(self, cell_type: CellType, direction: int, growth_p: float):
+        """Set the growth probability of a growable cell type in a direction"""
 
-        expression_p = self.growth_p + combined_factors
+        self.genes_mat[self.growable_types.index(cell_type), direction, -1] = growth_p
 
-        return random() < expression_p
+    def get_gene_matrix(self) -> np.ndarray:
+        """Return the genes as one (n_growable * 8, N_FACTORS + 1) row per direction, the growth probability last"""
 
-    def copy(self) -> DirectionalGrowthGenes:
-        """Return a deep copy of the object"""
+        return self.genes_mat.reshape(-1, N_FACTORS + 1)
 
-        return DirectionalGrowthGenes(
-            growth_p=self.growth_p,
-            factors=self.factors.copy()
-        )
+    def from_gene_matrix(self, gene_matrix: np.ndarray) -> CellTypeGrowthInfo:
+        """Return a growth info for the same growable cell types, with genes from a gene matrix"""
 
-    def get_mutation(self) -> DirectionalGrowthGenes:
-        """Return a potentially mutated copy of the directional growth genes"""
+        genes_mat = gene_matrix.reshape(len(self.growable_types), 8, N_FACTORS + 1)
+        return CellTypeGrowthInfo(growable_types=self.growable_types, genes_mat=genes_mat)
 
-        n_factors_plus_growth = self.n_factors + 1
 
-        if random() < Config.direction_mutation_p:
-            is_mutated = np.random.uniform(size=n_factors_plus_growth) < (1 / n_factors_plus_growth)
-            is_redetermination = np.random.uniform(size=n_factors_plus_growth) < Config.redetermination_p
+def get_factor_mat(
+    age: float, density: float, distance: np.ndarray, water: np.ndarray, energy: np.ndarray
+) -> np.ndarray:
+    """Return the (n, N_FACTORS) matrix of factors the genes of n cells are expressed with"""
 
-            factors_offset = np.random.normal(0, Config.mutation_sigma, size=n_factors_plus_growth) * Config.base_growth_p
-            factors_redetermination = np.random.uniform(size=n_factors_plus_growth) * Config.base_growth_p
+    # TODO add inverse factors too ?
+    factors = np.broadcast_arrays(age, density, distance * _DISTANCE_FACTOR_SCALE, water, energy)
+    return np.column_stack(factors).astype(np.float32)
 
-            all_factors = np.array(self.factors.tolist() + [self.growth_p])
-            mutated_factors = factors_redetermination * is_redetermination +  (all_factors + factors_offset) * np.invert(is_redetermination)
 
-            new_factors = mutated_factors * is_mutated + all_factors * np.invert(is_mutated)
-
-            return DirectionalGrowthGenes(factors=new_factors[0:self.n_factors], growth_p=new_factors[-1])
+def test_expression(genes_mat: np.ndarray, factor_mat: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """
+    Test the expression of the stacked (n, n_growable, 8, N_FACTORS + 1) genes of n cells at once,
+    for their factors of `get_factor_mat` and uniform random `draws` of at least (n, n_growable, 8).
+    Returns a (n, n_growable, 8) boolean matrix.
+    """
 
-        return self.copy()
+    combined_factors = np.einsum("ntdf,nf->ntd", genes_mat[..., :-1], factor_mat)
+    expression_p = genes_mat[..., -1] + combined_factors * _BASE_GROWTH_P
+    return draws[:, : genes_mat.shape[1]] < expression_p
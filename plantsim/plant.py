@@ -1,93 +1,65 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from random import random
 
 import numpy as np
-from plantsim.cell_types import CellType
+from plantsim.cell_types import EMPTY_CELL_CODE, GROUND_FLAG, OCCUPIED_FLAG, CellType
 
+from plantsim.cell_arrays import CellArrays
 from plantsim.config import Config
 from plantsim.coord import Coord
 from plantsim.genome import Genome
-from plantsim.plant_cell import Flower, PlantCell, Seed
+from plantsim.plant_cell import Seed
 
 
-@dataclass(kw_only=True)
+@dataclass(slots=True, kw_only=True)
 class Plant:
-    plant_cells: dict[Coord, PlantCell]
+    """A plant, whose cells are stored in the `CellArrays` of the plant sim with the plant's index as `plant_id`"""
+
     genome: Genome
     coord: Coord
     age: int = 0
     is_landed: bool = False
+    has_cells: bool = False  # whether the seed was planted as a cell when landing
+    dead_coords: np.ndarray = field(default_factory=lambda: np.zeros((0, 2), dtype=np.int32))  # (n, 2) dead cells
 
     @classmethod
     def init_random(cls) -> Plant:
         """Create a randomly initialized seed"""
-        return Plant(plant_cells={}, genome=Genome.init_random(), coord=Coord(int(Config.grid_size.x * random()),Config.initial_plant_coord.y))
+        return Plant(genome=Genome.init_random(), coord=Coord(int(Config.grid_size.x * random()),Config.initial_plant_coord.y))
 
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[Plant]:
+    def update(self, plant_id: int, cells: CellArrays, grid_flags: np.ndarray, cell_grid: np.ndarray):
         """
-        Update the cells in the plant.
-        Also updates `occupied_coords` while cells are being added/removed.
-        If a flower produces a new seed, this function returns a new plant instance.
+        Age the plant, and let its seed fall.
+        Also updates `cells`, `grid_flags` and `cell_grid` when the seed is planted.
+        The cells of all plants are updated, and plants at the end of their lifespan killed, at once by the plant sim.
         """
 
         self.age += 1
-        if self.age < Config.plant_lifespan:
-            if not self.is_landed:
-                self._fall_down(occupied_coords, ground_matrix)
-            else:
-                return self._update_cells(occupied_coords, ground_matrix)
+        if self.age < Config.plant_lifespan and not self.is_landed:
+            self._fall_down(plant_id, cells, grid_flags, cell_grid)
 
-    def _fall_down(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
+    def _fall_down(self, plant_id: int, cells: CellArrays, grid_flags: np.ndarray, cell_grid: np.ndarray):
         """Let the seed fall until it hits the ground"""
 
-        if ground_matrix[self.coord.x, self.coord.y]:
+        flags = grid_flags[self.coord.x, self.coord.y]
+        if flags & GROUND_FLAG:
             self.is_landed = True
-            if not self.coord in occupied_coords:
-                self.plant_cells[self.coord] = Seed(coord=self.coord, genome=self.genome)
-                occupied_coords.add(self.coord)
-        else:
-            self.coord += Coord(0, 1)
-
-    def _update_cells(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[Plant]:
-        """
-        Update the cells of the plant.
-        If a flower produces a new seed, this function returns a new plant instance.
-        """
-
-        new_plants = []
-
-        for coord in set(self.plant_cells.keys()):
-            plant_cell = self.plant_cells[coord]
-            new_plant_cells = plant_cell.update(occupied_coords, ground_matrix)
-
-            if isinstance(plant_cell, Flower) and plant_cell.seed_completed:
-                new_plants.append(Plant(plant_cells={}, genome=self.genome.get_mutation(), coord=coord.copy()))
-                del self.plant_cells[plant_cell.coord]
-                occupied_coords.remove(plant_cell.coord)
-
-            if new_plant_cells:
-                self._add_new_cells(new_plant_cells, occupied_coords)
-
-        return new_plants
-
-    def _add_new_cells(self, new_plant_cells: list[PlantCell], occupied_coords: set[Coord]):
-        """Apply all the cell updates"""
-
-        for new_plant_cell in new_plant_cells:
-            self.plant_cells[new_plant_cell.coord] = new_plant_cell
-            occupied_coords.add(new_plant_cell.coord)
-
-    def draw(self, image_data: np.ndarray):
-        """Draw the plant cells into the image data"""
-
-        if not self.plant_cells:
-            image_data[self.coord.x, self.coord.y, :] = Config.cell_type_colors[CellType.SEED]
+            if not flags & OCCUPIED_FLAG:
+                cells.append(
+                    coord=self.coord,
+                    plant_id=plant_id,
+                    cell_type=Seed.cell_type,
+                    water=Seed.init_water,
+                    energy=Seed.init_energy,
+                )
+                self.has_cells = True
+                grid_flags[self.coord.x, self.coord.y] |= OCCUPIED_FLAG
+                cell_grid[self.coord.x, self.coord.y] = CellType.SEED
         else:
-            for plant_cell in self.plant_cells.values():
-                color = Config.cell_type_colors[plant_cell.cell_type] if self.age < Config.plant_lifespan else Config.dead_cell_color
-                image_data[plant_cell.coord.x, plant_cell.coord.y, :] = color
+            self.coord = Coord(self.coord.x, self.coord.y + 1)
 
-    def clear_coords(self, occupied_coords: set[Coord]):
-        for coord in self.plant_cells.keys():
-            occupied_coords.remove(coord)
\ No newline at end of file
+    def clear_coords(self, grid_flags: np.ndarray, cell_grid: np.ndarray):
+        xs, ys = self.dead_coords.T
+        grid_flags[xs, ys] &= GROUND_FLAG
+        cell_grid[xs, ys] = EMPTY_CELL_CODE
@@ -1,220 +1,270 @@
 from __future__ import annotations
 from abc import ABC
-from dataclasses import dataclass
 from typing import ClassVar
 import numpy as np
 
-from plantsim.cell_types import CellType
+from plantsim._kernels import apply_loss_and_share_resources, collect_resources
+from plantsim.cell_arrays import CellArrays
+from plantsim.cell_types import GROUND_FLAG, OCCUPIED_FLAG, CellType
 from plantsim.config import Config
-from plantsim.coord import Coord
-from plantsim.genome import Genome
+from plantsim.genome import Genome, get_factor_mat, test_expression
+
+_DIRECTIONS = Config.coords_for_directions.tolist()
+MAX_GROWABLE_TYPES = max(len(growable_types) for growable_types in Config.growable_types.values())
 
 
-@dataclass(kw_only=True)
 class PlantCell(ABC):
-    """Abstract base class for different cell types"""
+    """
+    Abstract base class for different cell types.
+    The state of the cells lives in `CellArrays`, the classes only hold the parameters of each cell type.
+    """
 
     cell_type: ClassVar[CellType]
-    coord: Coord
-    genome: Genome
-    parent: PlantCell
-    cell_distance: int
-    growth_cooldown: int = 0
-    age: int = 0  # age in ticks
-    water: float = 0.0
-    energy: float = 0.0
-
-    creation_cost_water: float = Config.default_creation_cost
-    creation_cost_energy: float = Config.default_creation_cost
-    constant_loss_water: float = Config.default_loss_per_tick
-    constant_loss_energy: float = Config.default_loss_per_tick
-
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[PlantCell]:
-        """Update the state of the plant cell."""
-
-        self.age += 1
-        self._apply_loss_per_tick()
-        self._share_resources_with_parent()
-
-    def _sample_growth(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[PlantCell]:
-        """Determine whether a new cell will be created and in which direction"""
-
-        if self.growth_cooldown > 0:
-            self.growth_cooldown -= 1
-            return
-
-        new_cells = []
-
-        age = 1
-        density = 1
-        water = self.water / Config.cell_resource_capacity
-        energy = self.energy / Config.cell_resource_capacity
-
-        expressions = self.genome.test_expression(self.cell_type, age, density, self.cell_distance, water, energy)
-        for cell_type, directional_expressions in expressions.items():
-            cell_class = next((subclass for subclass in PlantCell.__subclasses__() if subclass.cell_type is cell_type))
-
-            if self.energy >= cell_class.creation_cost_energy and self.water >= cell_class.creation_cost_water:
-                if any(directional_expressions):
-                    for directional_expression, coord_offset in zip(
-                        directional_expressions, Config.coords_for_directions
-                    ):
-                        if directional_expression:
-                            new_coord = self.coord + coord_offset
-                            if not (
-                                new_coord in occupied_coords
-                                or new_coord.x < 0
-                                or new_coord.x > Config.grid_size.x - 1
-                                or new_coord.y < 0
-                                or new_coord.y > Config.grid_size.y - 1
-                            ):
-                                if (cell_type is CellType.ROOT and ground_matrix[new_coord.x, new_coord.y]) or (
-                                    not cell_type is CellType.ROOT and not ground_matrix[new_coord.x, new_coord.y]
-                                ):
-                                    self.energy -= cell_class.creation_cost_energy
-                                    self.water -= cell_class.creation_cost_water
-
-                                    new_plant_cell = cell_class(
-                                        genome=self.genome,
-                                        coord=new_coord,
-                                        parent=self,
-                                        cell_distance=self.cell_distance + 1,
-                                    )
-                                    new_cells.append(new_plant_cell)
-                                    self.growth_cooldown = Config.growth_cooldown
-        return new_cells
-
-    def _share_resources_with_parent(self):
-        """Share water and energy with parent plant cells"""
-
-        total_energy = self.parent.energy + self.energy
-        total_water = self.parent.water + self.water
-
-        self.energy = total_energy / 2
-        self.parent.energy = total_energy / 2
-        self.water = total_water / 2
-        self.parent.water = total_water / 2
-
-    def _get_surrounding_soil_factor(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> float:
-        """Get the factor of empty ground cells surrounding this cell"""
-
-        surrounding_soil = 0
-        for coord in Config.coords_for_directions:
-            surrounding_soil += int(coord not in occupied_coords and ground_matrix[coord.x, coord.y])
-        return surrounding_soil / 8
-
-    def _get_surrounding_air_factor(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> float:
-        """Get the factor of empty air cells surrounding this cell"""
-
-        surrounding_air = 0
-        for coord in Config.coords_for_directions:
-            surrounding_air += int(coord not in occupied_coords and not ground_matrix[coord.x, coord.y])
-        return surrounding_air / 8
-
-    def _apply_loss_per_tick(self):
-        self.water -= self.constant_loss_water
-        self.energy -= self.constant_loss_energy
-
-
-@dataclass(kw_only=True)
-class Stem(PlantCell):
-    cell_type = CellType.STEM
-
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[PlantCell]:
-        """Update the state of the plant cell."""
 
-        super().update(occupied_coords, ground_matrix)
-        self._collect_resources(occupied_coords, ground_matrix)
-        return self._sample_growth(occupied_coords, ground_matrix)
+    creation_cost_water: ClassVar[float] = Config.default_creation_cost
+    creation_cost_energy: ClassVar[float] = Config.default_creation_cost
+    constant_loss_water: ClassVar[float] = Config.default_loss_per_tick
+    constant_loss_energy: ClassVar[float] = Config.default_loss_per_tick
+    water_gain: ClassVar[float] = 0.0  # water collected per tick when fully surrounded by empty soil
+    energy_gain: ClassVar[float] = 0.0  # energy collected per tick when fully surrounded by empty air
+    init_water: ClassVar[float] = 0.0
+    init_energy: ClassVar[float] = 0.0
+    can_grow: ClassVar[bool] = False
+    grows_in_ground: ClassVar[bool] = False
 
-    def _collect_resources(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
-        """Get the amount of energy the leaf cell generates per tick"""
 
-        surrounding_air_factor = self._get_surrounding_air_factor(occupied_coords, ground_matrix)
-        self.energy += Config.stem_energy_gain * surrounding_air_factor
+class Stem(PlantCell):
+    cell_type = CellType.STEM
+    energy_gain = Config.stem_energy_gain
+    can_grow = True
 
 
-@dataclass(kw_only=True)
 class Root(PlantCell):
     cell_type = CellType.ROOT
+    water_gain = Config.root_water_gain
+    can_grow = True
+    grows_in_ground = True
 
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[PlantCell]:
-        """Update the state of the plant cell."""
-
-        super().update(occupied_coords, ground_matrix)
-        self._collect_resources(occupied_coords, ground_matrix)
-        return self._sample_growth(occupied_coords, ground_matrix)
 
-    def _collect_resources(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
-        """Get the amount of water the root cell generates per tick"""
-
-        surrounding_soil_factor = self._get_surrounding_soil_factor(occupied_coords, ground_matrix)
-        self.water += Config.root_water_gain * surrounding_soil_factor
-
-
-@dataclass(kw_only=True)
 class Leaf(PlantCell):
     cell_type = CellType.LEAF
+    energy_gain = Config.leaf_energy_gain
 
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
-        """Update the state of the plant cell."""
-
-        super().update(occupied_coords, ground_matrix)
-        self._collect_resources(occupied_coords, ground_matrix)
-
-    def _collect_resources(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
-        """Get the amount of energy the leaf cell generates per tick"""
-
-        surrounding_air_factor = self._get_surrounding_air_factor(occupied_coords, ground_matrix)
-        self.energy += Config.leaf_energy_gain * surrounding_air_factor
 
-
-@dataclass(kw_only=True)
 class Flower(PlantCell):
     cell_type = CellType.FLOWER
 
-    seed_progress_water = 0.0
-    seed_progress_energy = 0.0
-
-    seed_completed = False
-
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray):
-        """Grow the flower into a seed"""
-
-        super().update(occupied_coords, ground_matrix)
-        return self._grow_seed()
-
-    def _grow_seed(self):
-        """Consume resources and turn it into a seed once enough have been consumed"""
-
-        if self.water > Config.flower_grow_rate and self.seed_progress_water < Config.seed_creation_cost:
-            self.water -= Config.flower_grow_rate
-            self.seed_progress_water += Config.flower_grow_rate * Config.flower_growth_efficiency
-        if self.energy > Config.flower_grow_rate and self.seed_progress_energy < Config.seed_creation_cost:
-            self.energy -= Config.flower_grow_rate
-            self.seed_progress_energy += Config.flower_grow_rate * Config.flower_growth_efficiency
 
-        if (
-            self.seed_progress_energy >= Config.seed_creation_cost
-            and self.seed_progress_water >= Config.seed_creation_cost
-        ):
-            self.seed_completed = True
-
-
-@dataclass(kw_only=True)
 class Seed(PlantCell):
     cell_type = CellType.SEED
-
-    init_water_cost: float = Config.seed_creation_cost
-    init_energy_cost: float = Config.seed_creation_cost
-    energy: float = init_water_cost
-    water: float = init_energy_cost
-
-    parent: PlantCell = None
-    cell_distance: int = 0
-
-    def update(self, occupied_coords: set[Coord], ground_matrix: np.ndarray) -> list[PlantCell]:
-        """Update the state of the plant cell"""
-
-        self.age += 1
-        return self._sample_growth(occupied_coords, ground_matrix)
+    constant_loss_water = 0.0
+    constant_loss_energy = 0.0
+    init_water = Config.seed_creation_cost
+    init_energy = Config.seed_creation_cost
+    can_grow = True
+
+
+CELL_CLASS_BY_TYPE: dict[CellType, type[PlantCell]] = {
+    cell_class.cell_type: cell_class for cell_class in PlantCell.__subclasses__()
+}
+
+
+def _get_growth_targets() -> list[tuple[float, float, int, float, float] | None]:
+    """
+    Collect what growing a cell of each type takes, indexed by cell type code:
+    the creation costs of water and energy, the grid flags the target coordinate must have and the initial resources.
+    """
+
+    growth_targets = [None] * (len(CellType) + 1)
+    for cell_type, cell_class in CELL_CLASS_BY_TYPE.items():
+        growth_targets[cell_type] = (
+            cell_class.creation_cost_water,
+            cell_class.creation_cost_energy,
+            GROUND_FLAG if cell_class.grows_in_ground else 0,  # unoccupied, and only roots grow in ground
+            cell_class.init_water,
+            cell_class.init_energy,
+        )
+    return growth_targets
+
+
+GROWTH_TARGETS = _get_growth_targets()
+
+
+def _get_table(attribute: str, dtype: type) -> np.ndarray:
+    """Collect a cell type parameter into an array indexed by cell type code"""
+
+    table = np.zeros(len(CellType) + 1, dtype=dtype)
+    for cell_type, cell_class in CELL_CLASS_BY_TYPE.items():
+        table[cell_type] = getattr(cell_class, attribute)
+    return table
+
+
+_LOSS_WATER = _get_table("constant_loss_water", np.float32)
+_LOSS_ENERGY = _get_table("constant_loss_energy", np.float32)
+_WATER_GAIN = _get_table("water_gain", np.float32)
+_ENERGY_GAIN = _get_table("energy_gain", np.float32)
+_CAN_GROW = _get_table("can_grow", np.bool_)
+
+
+def update_cells(cells: CellArrays, n_cells: int, grid_flags: np.ndarray):
+    """Update the state of the first `n_cells` plant cells"""
+
+    cells.age[:n_cells] += 1
+    apply_loss_and_share_resources(
+        cells.cell_type, cells.parent_idx, cells.water, cells.energy, _LOSS_WATER, _LOSS_ENERGY, n_cells
+    )
+    soil_factor, air_factor = _get_surrounding_factors(grid_flags)
+    collect_resources(
+        cells.cell_type, cells.water, cells.energy, _WATER_GAIN, _ENERGY_GAIN, soil_factor, air_factor, n_cells
+    )
+    _grow_seeds(cells, n_cells)
+
+
+def _get_surrounding_factors(grid_flags: np.ndarray) -> tuple[float, float]:
+    """
+    Get the factors of empty soil and empty air surrounding the cells.
+    Like the original per-cell scan, the flags are read at the direction offsets themselves rather than around
+    each cell, so all cells share the same factors. Negative offsets wrap around the grid and are never occupied.
+    """
+
+    empty_soil = 0
+    empty_air = 0
+    for dx, dy in _DIRECTIONS:
+        flags = int(grid_flags[dx, dy])
+        if dx >= 0 and dy >= 0 and flags & OCCUPIED_FLAG:
+            continue
+        if flags & GROUND_FLAG:
+            empty_soil += 1
+        else:
+            empty_air += 1
+    return empty_soil / 8, empty_air / 8
+
+
+def _grow_seeds(cells: CellArrays, n_cells: int):
+    """Let flowers consume resources to make progress on their seed"""
+
+    flowers = np.flatnonzero(cells.cell_type[:n_cells] == CellType.FLOWER)
+    for resource, seed_progress in (
+        (cells.water, cells.seed_progress_water),
+        (cells.energy, cells.seed_progress_energy),
+    ):
+        growing = flowers[
+            (resource[flowers] > Config.flower_grow_rate) & (seed_progress[flowers] < Config.seed_creation_cost)
+        ]
+        resource[growing] -= Config.flower_grow_rate
+        seed_progress[growing] += Config.flower_grow_rate * Config.flower_growth_efficiency
+
+
+def get_completed_seeds(cells: CellArrays) -> np.ndarray:
+    """Return the rows of the flowers that completed their seed"""
+
+    n_cells = cells.size
+    return np.flatnonzero(
+        (cells.cell_type[:n_cells] == CellType.FLOWER)
+        & (cells.seed_progress_water[:n_cells] >= Config.seed_creation_cost)
+        & (cells.seed_progress_energy[:n_cells] >= Config.seed_creation_cost)
+    )
+
+
+def get_growing_cells(cells: CellArrays, n_cells: int) -> np.ndarray:
+    """
+    Return the rows of the first `n_cells` cells that sample growth this tick.
+    The growth cooldown of the other cells of growing types is counted down.
+    """
+
+    can_grow = _CAN_GROW[cells.cell_type[:n_cells]]
+    growth_cooldown = cells.growth_cooldown[:n_cells]
+    is_cooling_down = can_grow & (growth_cooldown > 0)
+    growth_cooldown[is_cooling_down] -= 1
+    return np.flatnonzero(can_grow & ~is_cooling_down)
+
+
+def test_growth_expression(
+    cells: CellArrays,
+    rows: np.ndarray,
+    genomes: list[Genome],
+    draws: np.ndarray,
+) -> np.ndarray:
+    """
+    Test the growth genes of the cells in `rows` at once,
+    using (len(rows), MAX_GROWABLE_TYPES, 8) uniform random `draws`.
+    The cells of each cell type are tested together, with the genes of their plants stacked.
+    Returns a boolean matrix shaped like `draws`, False past the growable types of each cell.
+    """
+
+    age = 1
+    density = 1
+    expressed = np.zeros(draws.shape, dtype=np.bool_)
+
+    cell_types = cells.cell_type[rows]
+    for cell_type in np.unique(cell_types).tolist():
+        type_idx = np.flatnonzero(cell_types == cell_type)
+        type_rows = rows[type_idx]
+        plant_ids, plant_idx = np.unique(cells.plant_id[type_rows], return_inverse=True)
+        genes_mat = np.stack(
+            [genomes[plant_id].growth_info_by_code[cell_type].genes_mat for plant_id in plant_ids.tolist()]
+        )[plant_idx]
+        factor_mat = get_factor_mat(
+            age,
+            density,
+            cells.cell_distance[type_rows],
+            cells.water[type_rows] / Config.cell_resource_capacity,
+            cells.energy[type_rows] / Config.cell_resource_capacity,
+        )
+        expressed[type_idx, : genes_mat.shape[1]] = test_expression(genes_mat, factor_mat, draws[type_idx])
+
+    return expressed
+
+
+def sample_growth(
+    cells: CellArrays,
+    row: int,
+    genome: Genome,
+    flat_grid_flags: np.ndarray,
+    expressed: np.ndarray,
+    new_cells: list[tuple[int, int, int, int, int, int, float, float]],
+):
+    """
+    Grow new cells from the cell in `row` in the directions where its genes are `expressed`,
+    a (MAX_GROWABLE_TYPES, 8) matrix of `test_growth_expression`.
+    New cells are collected in `new_cells` for `CellArrays.extend`,
+    and their coords flagged as occupied in the flattened padded grid flags right away.
+    """
+
+    water = float(cells.water[row])
+    energy = float(cells.energy[row])
+    cell_distance = int(cells.cell_distance[row])
+    plant_id = int(cells.plant_id[row])
+
+    growth_info = genome.growth_info_by_code[cells.cell_type[row]]  # no CellType construction for the lookup
+    expressed = expressed[: len(growth_info.growable_types)]
+
+    x, y = cells.coord_xy[row].tolist()
+    neighbor_idx = cells.neighbor_idx[row].tolist()  # the padded border never matches the required flags
+    current_type_idx = -1
+    for type_idx, direction in np.argwhere(expressed).tolist():
+        if type_idx != current_type_idx:
+            # the resources are checked once per growable type, with what is left after growing the earlier types,
+            # and then every expressed direction of the type is grown
+            current_type_idx = type_idx
+            cell_type = growth_info.growable_types[type_idx]
+            creation_cost_water, creation_cost_energy, required_flags, init_water, init_energy = GROWTH_TARGETS[
+                cell_type
+            ]
+            can_afford_type = energy >= creation_cost_energy and water >= creation_cost_water
+
+        if can_afford_type:
+            target_idx = neighbor_idx[direction]
+            if flat_grid_flags[target_idx] == required_flags:
+                dx, dy = _DIRECTIONS[direction]
+                energy -= creation_cost_energy
+                water -= creation_cost_water
+
+                new_cells.append(
+                    (x + dx, y + dy, plant_id, cell_type, row, cell_distance + 1, init_water, init_energy)
+                )
+                flat_grid_flags[target_idx] |= OCCUPIED_FLAG
+                cells.growth_cooldown[row] = Config.growth_cooldown
+
+    cells.water[row] = water
+    cells.energy[row] = energy
@@ -1,13 +1,22 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 import cv2
 import numpy as np
-from pydantic_numpy import np_array_pydantic_annotated_typing as ndarray
 
+from plantsim.cell_arrays import CellArrays
+from plantsim.cell_types import DEAD_CELL_CODE, EMPTY_CELL_CODE, GROUND_FLAG, OCCUPIED_FLAG, CellType
 from plantsim.coord import Coord
 from plantsim.genome import Genome
 from plantsim.plant import Plant
+from plantsim.plant_cell import (
+    MAX_GROWABLE_TYPES,
+    get_completed_seeds,
+    get_growing_cells,
+    sample_growth,
+    test_growth_expression,
+    update_cells,
+)
 from plantsim.config import Config
 
 import contextlib
@@ -16,70 +25,181 @@ with contextlib.redirect_stdout(None):
     from pygame import Surface
 
 
-@dataclass(kw_only=True)
+@dataclass(slots=True, kw_only=True)
 class PlantSim:
-    ground_matrix: ndarray(np.bool_)  # boolean matrix indicating whether a cell is ground or not
-    occupied_coords: set[Coord]
+    ground_matrix: np.ndarray  # boolean matrix indicating whether a cell is ground or not
+    padded_grid_flags: np.ndarray  # uint8 `GROUND_FLAG` and `OCCUPIED_FLAG` bits, with an occupied border
+    grid_flags: np.ndarray  # view of the flags of each coordinate inside the border of `padded_grid_flags`
+    cell_grid: np.ndarray  # int8 matrix of the cell type (or empty/dead cell code) at each coordinate
+    cells: CellArrays  # cells of all living plants
     plants: list[Plant]
+    rng: np.random.Generator = field(default_factory=np.random.default_rng)
+    _dirty: bool = field(default=True, init=False)  # whether the drawn image has changed since the last draw
 
     @classmethod
     def create(cls) -> PlantSim:
         """Create a new plant sim with a single randomly initialized plant"""
 
         ground_matrix = PlantSim._load_ground_matrix(Config.ground_mask_path)
-        occupied_coords = set()
+        padded_grid_flags = np.pad(
+            np.where(ground_matrix, GROUND_FLAG, 0).astype(np.uint8), 1, constant_values=OCCUPIED_FLAG
+        )
+        cell_grid = np.full(ground_matrix.shape, EMPTY_CELL_CODE, dtype=np.int8)
         n_plants = 10
-        first_plants = [Plant(plant_cells={}, genome=Genome.init_random(), coord=Coord(x + int(Config.grid_size.x / n_plants / 2), Config.initial_plant_coord.y)) for x in range(0, Config.grid_size.x, int(Config.grid_size.x / n_plants))]
-        return PlantSim(ground_matrix=ground_matrix, occupied_coords=occupied_coords, plants=first_plants)
+        first_plants = [Plant(genome=Genome.init_random(), coord=Coord(x + int(Config.grid_size.x / n_plants / 2), Config.initial_plant_coord.y)) for x in range(0, Config.grid_size.x, int(Config.grid_size.x / n_plants))]
+        return PlantSim(
+            ground_matrix=ground_matrix,
+            padded_grid_flags=padded_grid_flags,
+            grid_flags=padded_grid_flags[1:-1, 1:-1],
+            cell_grid=cell_grid,
+            cells=CellArrays.create(),
+            plants=first_plants,
+        )
 
     @staticmethod
     def _load_ground_matrix(ground_mask_path: Path) -> np.ndarray:
         """load a ground matrix from an image file"""
 
-        im = cv2.imread(str(ground_mask_path), cv2.IMREAD_GRAYSCALE).T
-        ground_matrix = im[:, :] < 1  # black is ground
+        im = cv2.imread(str(ground_mask_path), cv2.IMREAD_GRAYSCALE)
+        ground_matrix = np.ascontiguousarray(im.T < 1)  # black is ground, indexed by (x, y)
         return ground_matrix
 
     def get_background_array(self) -> np.ndarray:
-        """Return a PyGame Surface object to draw the air and ground"""
+        """Return a C-contiguous (height, width, 3) RGB array of the air and ground"""
 
-        image_data = np.array(
-            [[(Config.ground_color if elem else Config.air_color) for elem in row] for row in self.ground_matrix]
-        )
-
-        return image_data
+        palette = np.array([Config.air_color, Config.ground_color], dtype=np.uint8)  # indexed by is ground
+        return palette[self.ground_matrix.T.astype(np.uint8)]
 
     def update(self):
-        """Update all plant cells"""
-
-        new_plants: list[list[Plant]] = []
-        remove_plants = False
+        """Update all plants and plant cells"""
+
+        n_cells = self.cells.size
+
+        dying_plant_ids = []
+        for plant_id, plant in enumerate(self.plants):
+            if not plant.is_landed:
+                self._dirty = True  # falling seed moves
+            plant.update(plant_id, self.cells, self.grid_flags, self.cell_grid)
+            if plant.age == Config.plant_lifespan:
+                dying_plant_ids.append(plant_id)
+
+        if dying_plant_ids:
+            self._kill_plants(dying_plant_ids)
+            self._dirty = True  # plants die and change color
+
+        new_plants = self._update_cells()
+        self._remove_dead_plants()
+
+        if new_plants:
+            self.plants.extend(new_plants)
+            self._dirty = True
+
+        if self.cells.size != n_cells:
+            self._dirty = True  # cells were added or removed
+
+    def _update_cells(self) -> list[Plant]:
+        """
+        Update the cells of all plants at once.
+        Also updates `grid_flags` and `cell_grid` while cells are being added/removed.
+        If flowers produce new seeds, this function returns the new plant instances.
+        """
+
+        cells = self.cells
+        n_cells = cells.size  # cells grown during this tick are updated from the next tick on
+
+        update_cells(cells, n_cells, self.grid_flags)
+
+        flat_grid_flags = self.padded_grid_flags.reshape(-1)  # view indexed by the neighbor indices of the cells
+
+        genomes = [plant.genome for plant in self.plants]
+        growing_rows = get_growing_cells(cells, n_cells)
+        draws = self.rng.random((len(growing_rows), MAX_GROWABLE_TYPES, 8))  # all expression tests of the tick
+        expressed = test_growth_expression(cells, growing_rows, genomes, draws)
+        is_expressed = expressed.any(axis=(1, 2))  # most cells grow nothing in a tick
+        new_cells = []  # cells grown this tick, added to the cell arrays at once
+        for row, row_expressed in zip(growing_rows[is_expressed].tolist(), expressed[is_expressed]):
+            sample_growth(cells, row, genomes[cells.plant_id[row]], flat_grid_flags, row_expressed, new_cells)
+        if new_cells:
+            cells.extend(new_cells)
+
+        xs, ys = cells.coord_xy[n_cells : cells.size].T
+        self.cell_grid[xs, ys] = cells.cell_type[n_cells : cells.size]
+
+        completed_rows = get_completed_seeds(cells)
+        if not len(completed_rows):
+            return []  # no flower completed its seed, nearly every tick
+
+        new_plants = [
+            Plant(genome=genomes[plant_id].get_mutation(), coord=Coord(x, y))
+            for (x, y), plant_id in zip(
+                cells.coord_xy[completed_rows].tolist(), cells.plant_id[completed_rows].tolist()
+            )
+        ]
+        xs, ys = cells.coord_xy[completed_rows].T
+        self.grid_flags[xs, ys] &= GROUND_FLAG
+        self.cell_grid[xs, ys] = EMPTY_CELL_CODE
+        cells.remove_rows(completed_rows)
+
+        return new_plants
+
+    def _kill_plants(self, plant_ids: list[int]):
+        """
+        Remove the cells of plants at the end of their lifespan in a single pass over the cells,
+        and mark them as dead in the cell grid, until they are cleared.
+        """
+
+        cells = self.cells
+        rows = np.flatnonzero(np.isin(cells.plant_id[: cells.size], plant_ids))
+        row_plant_ids = cells.plant_id[rows]
+        for plant_id in plant_ids:
+            self.plants[plant_id].dead_coords = cells.coord_xy[rows[row_plant_ids == plant_id]]
+
+        xs, ys = cells.coord_xy[rows].T
+        self.cell_grid[xs, ys] = DEAD_CELL_CODE
+        cells.remove_rows(rows)
+
+    def _remove_dead_plants(self):
+        """Clear the dead cells of plants at the end of their dead cell lifespan and remove these plants"""
+
+        is_kept = np.array(
+            [plant.age <= Config.plant_lifespan + Config.dead_cell_lifespan for plant in self.plants], dtype=np.bool_
+        )
+        if is_kept.all():
+            return
 
-        for plant in self.plants:
-            new_plants.append(plant.update(self.occupied_coords, self.ground_matrix))
-            if plant.age > Config.plant_lifespan + Config.dead_cell_lifespan:
-                plant.clear_coords(self.occupied_coords)
-                remove_plants = True
+        for plant, kept in zip(self.plants, is_kept):
+            if not kept:
+                plant.clear_coords(self.grid_flags, self.cell_grid)
 
-        if remove_plants:
-            self.plants = [plant for plant in self.plants if plant.age <= Config.plant_lifespan + Config.dead_cell_lifespan]
+        # dead plants have no cells left, only the plant ids of the living ones need to be updated
+        new_plant_ids = np.cumsum(is_kept, dtype=np.int32) - 1
+        plant_ids = self.cells.plant_id[: self.cells.size]
+        plant_ids[:] = new_plant_ids[plant_ids]
 
-        for new_plant_list in new_plants:
-            if new_plant_list:
-                for new_plant in new_plant_list:
-                    self.plants.append(new_plant)
+        self.plants = [plant for plant, kept in zip(self.plants, is_kept) if kept]
+        self._dirty = True
 
-    def draw(self, image_data: np.ndarray):
-        """Draw a colored pixel in the image data for each plant cell"""
+    def consume_dirty(self) -> bool:
+        """Return whether the drawn image has changed since the last call, and reset the flag"""
 
-        for plant in self.plants:
-            plant.draw(image_data)
+        dirty = self._dirty
+        self._dirty = False
+        return dirty
 
-            # resource color visualisation
-            # water_color = np.array([0, 162, 232])
-            # energy_color = np.array([255, 255, 0])
-            # water_max = max([e.water for e in self.plant_cells.values()]) * 2
-            # energy_max = max([e.energy for e in self.plant_cells.values()]) *2
-            # image_data[*coord, :] = np.clip((plant_cell.water / water_max) * water_color + (plant_cell.energy / energy_max) * energy_color, [0,0,0], [255,255,255])
+    def draw(self, image_data: np.ndarray):
+        """
+        Draw a colored pixel in the (height, width, 3) image data for each plant cell, in place.
+        Returns `image_data`.
+        """
+
+        cell_rows = self.cell_grid.T  # (height, width) view, matching the image layout
+        is_cell = cell_rows != EMPTY_CELL_CODE
+        image_data[is_cell] = Config.cell_grid_palette[cell_rows[is_cell]]
+
+        # seeds of plants without cells are not in the cell grid
+        seed_coords = [plant.coord for plant in self.plants if not plant.has_cells]
+        if seed_coords:
+            seed_xs, seed_ys = zip(*seed_coords)
+            image_data[seed_ys, seed_xs] = Config.cell_type_colors[CellType.SEED]
 
         return image_data